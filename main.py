@@ -9,9 +9,17 @@ from datetime import datetime, timedelta
 import re
 import asyncio
 import tempfile
+import functools
+import time
+import queue
+import atexit
+from contextlib import contextmanager
+from collections import Counter, OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Optional
 
 # -------------------------------------------------------------------------------------
-# OPTIONAL IMPORTS (PDF and OCR)
+# OPTIONAL IMPORTS (PDF, OCR, uvloop, orjson and HTTP/2)
 # -------------------------------------------------------------------------------------
 pdf_available = True
 try:
@@ -28,27 +36,64 @@ except ImportError:
     pytesseract_available = False
     pillow_available = False
 
+uvloop_available = True
+try:
+    import uvloop
+except ImportError:
+    uvloop_available = False
+
+orjson_available = True
+try:
+    import orjson
+except ImportError:
+    orjson_available = False
+
+http2_available = True
+try:
+    import h2  # noqa: F401 -- httpx only needs it importable for HTTP/2
+except ImportError:
+    http2_available = False
+
 from telegram import Update, ChatPermissions
+from telegram.constants import ChatType
 from telegram.ext import (
     ApplicationBuilder,
+    BaseRateLimiter,
     ContextTypes,
     CommandHandler,
     MessageHandler,
     filters,
 )
+from telegram.error import NetworkError
 from telegram.helpers import escape_markdown
+from telegram.request import HTTPXRequest
 
 # ------------------- Configuration -------------------
 
-DATABASE = 'warnings.db'
+DATABASE = 'warnings.db'  # WAL mode keeps warnings.db-wal / warnings.db-shm beside it while the bot runs
 ALLOWED_USER_ID = 6177929931  # <-- ضع معرف المستخدم الخاص بك هنا
 LOCK_FILE = '/tmp/telegram_bot.lock'
 MESSAGE_DELETE_TIMEFRAME = 15
 ALLOWED_STATUSES = ("member", "administrator", "creator")
-
-# In-memory dict for group name requests and other flows
-pending_group_names = {}
+API_CONNECTION_POOL_SIZE = 64  # warm keep-alive connections for outgoing API calls
+MAX_SENDS_PER_SECOND = 30  # Telegram's global bot limit
+MAX_CONCURRENT_UPDATES = 32  # updates handled at once; per-chat order is kept by chat_locks
+PRIVATE_SEND_INTERVAL = 1.0  # seconds between sends to one private chat
+GROUP_SEND_INTERVAL = 3.0  # groups allow about 20 messages per minute
+
+# Handlers only consume plain messages, so have Telegram filter the rest server-side
+ALLOWED_UPDATES = [Update.MESSAGE]
+
+# Chat type first so group messages fail the cheapest check and skip the rest
+PRIVATE_TEXT_FILTER = filters.ChatType.PRIVATE & filters.TEXT & ~filters.COMMAND
+GROUP_MESSAGE_FILTER = filters.ChatType.GROUPS
+
+# Group names the admin still owes after /group_add: user_id -> (group_id, monotonic deadline)
+PENDING_NAME_TTL = 600  # seconds
+PENDING_NAME_MAX = 64
+pending_group_names = OrderedDict()
 user_flows = {}  # to handle /delete and /msg flows
+chat_locks = defaultdict(asyncio.Lock)  # keeps per-chat ordering under concurrent updates
 
 # ------------------- Logging Setup -------------------
 
@@ -58,12 +103,59 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# ------------------- Environment Config -------------------
+
+@dataclass(frozen=True, slots=True)
+class Config:
+    token: str
+    mode: str
+    webhook_url: Optional[str]
+    webhook_secret: Optional[str]
+    port: int
+    drop_pending: bool
+
+def _normalize_token(raw: str) -> str:
+    """Strip whitespace and an optional 'bot=' prefix from the raw BOT_TOKEN value."""
+    raw = raw.strip()
+    if raw[:4].lower() == 'bot=':
+        raw = raw[4:].strip()
+    return raw
+
+def load_config():
+    token = _normalize_token(os.getenv('BOT_TOKEN') or "")
+    if not token:
+        logger.error("BOT_TOKEN not set.")
+        sys.exit("BOT_TOKEN not set.")
+
+    # BOT_MODE=webhook lets Telegram push updates instead of us polling getUpdates
+    mode = os.getenv('BOT_MODE', 'polling').strip().lower()
+    webhook_url = os.getenv('WEBHOOK_URL')
+    if mode == 'webhook' and not webhook_url:
+        logger.error("BOT_MODE is webhook but WEBHOOK_URL not set.")
+        sys.exit("WEBHOOK_URL not set.")
+
+    return Config(
+        token=token,
+        mode=mode,
+        webhook_url=webhook_url.rstrip('/') if webhook_url else None,
+        webhook_secret=os.getenv('WEBHOOK_SECRET'),
+        port=int(os.getenv('PORT', '8443')),
+        # DROP_PENDING=1 skips the update backlog queued while the bot was down
+        drop_pending=os.getenv('DROP_PENDING', '0').strip() == '1'
+    )
+
+CONFIG = load_config()
+
 # ------------------- File Lock Mechanism -------------------
 
 def acquire_lock():
     try:
-        lock_file = open(LOCK_FILE, 'w')
+        # No O_TRUNC: a losing starter must not wipe the running instance's PID before flock refuses it
+        lock_file = os.fdopen(os.open(LOCK_FILE, os.O_CREAT | os.O_WRONLY, 0o644), 'w')
         fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
         logger.info("Lock acquired. Only one instance running.")
         return lock_file
     except IOError:
@@ -74,517 +166,750 @@ def release_lock(lock_file):
     try:
         fcntl.flock(lock_file, fcntl.LOCK_UN)
         lock_file.close()
-        os.remove(LOCK_FILE)
         logger.info("Lock released. Bot stopped.")
     except Exception as e:
-        logger.error(f"Error releasing lock: {e}")
+        logger.error("Error releasing lock: %s", e)
 
 lock_file = acquire_lock()
-import atexit
 atexit.register(release_lock, lock_file)
 
 # ------------------- DB Initialization -------------------
 
+# Applied to every pooled connection; journal_mode=WAL is persistent and set once in init_db()
+SQLITE_CONNECTION_PRAGMAS = '''
+    PRAGMA synchronous = NORMAL;
+    PRAGMA temp_store = MEMORY;
+    PRAGMA mmap_size = 268435456;
+    PRAGMA cache_size = -20000;
+'''
+
+DB_POOL_SIZE = 4
+db_pool = queue.Queue(maxsize=DB_POOL_SIZE)  # long-lived connections, filled by open_db_pool()
+
+def connect_db():
+    conn = sqlite3.connect(DATABASE, check_same_thread=False)
+    conn.executescript(SQLITE_CONNECTION_PRAGMAS)
+    return conn
+
+def open_db_pool():
+    while not db_pool.full():
+        db_pool.put_nowait(connect_db())
+    logger.info("Opened %s pooled DB connections.", DB_POOL_SIZE)
+
+def close_db_pool():
+    while not db_pool.empty():
+        db_pool.get_nowait().close()
+
+@contextmanager
+def get_conn():
+    """Borrow a pooled connection; the block commits on success and rolls back on error."""
+    conn = db_pool.get()
+    try:
+        with conn:
+            yield conn
+    finally:
+        db_pool.put(conn)
+
+atexit.register(close_db_pool)
+
+# Tables the handlers read after startup; groups, bypass_users and deletion_settings are served from memory
+DB_WARMUP_QUERIES = (
+    "SELECT 1 FROM removed_users LIMIT 1",
+)
+
+def warm_db_pool():
+    """Read once through every pooled connection so schema parsing happens before the first update."""
+    conns = [db_pool.get_nowait() for _ in range(db_pool.qsize())]
+    try:
+        for conn in conns:
+            for query in DB_WARMUP_QUERIES:
+                conn.execute(query).fetchone()
+    finally:
+        for conn in conns:
+            db_pool.put_nowait(conn)
+
 def init_permissions_db():
     try:
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS permissions (
-                user_id INTEGER PRIMARY KEY,
-                role TEXT NOT NULL
-            )
-        ''')
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS removed_users (
-                group_id INTEGER,
-                user_id INTEGER,
-                removal_reason TEXT,
-                removal_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                PRIMARY KEY (group_id, user_id),
-                FOREIGN KEY (group_id) REFERENCES groups(group_id)
-            )
-        ''')
-        conn.commit()
-        conn.close()
+        with get_conn() as conn:
+            conn.executescript('''
+                BEGIN;
+                CREATE TABLE IF NOT EXISTS permissions (
+                    user_id INTEGER PRIMARY KEY,
+                    role TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS removed_users (
+                    group_id INTEGER,
+                    user_id INTEGER,
+                    removal_reason TEXT,
+                    removal_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (group_id, user_id),
+                    FOREIGN KEY (group_id) REFERENCES groups(group_id)
+                );
+                COMMIT;
+            ''')
         logger.info("Permissions & Removed Users tables initialized.")
     except Exception as e:
-        logger.error(f"Failed to init permissions DB: {e}")
+        logger.error("Failed to init permissions DB: %s", e)
         raise
 
 def init_db():
     try:
-        conn = sqlite3.connect(DATABASE)
-        conn.execute("PRAGMA foreign_keys = 1")
-        c = conn.cursor()
-
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS groups (
-                group_id INTEGER PRIMARY KEY,
-                group_name TEXT
-            )
-        ''')
-
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS bypass_users (
-                user_id INTEGER PRIMARY KEY
-            )
-        ''')
-
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS deletion_settings (
-                group_id INTEGER PRIMARY KEY,
-                enabled BOOLEAN NOT NULL DEFAULT 0,
-                FOREIGN KEY(group_id) REFERENCES groups(group_id)
-            )
-        ''')
-
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                first_name TEXT,
-                last_name TEXT,
-                username TEXT
-            )
-        ''')
-
-        conn.commit()
-        conn.close()
+        open_db_pool()
+        with get_conn() as conn:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.executescript('''
+                BEGIN;
+                CREATE TABLE IF NOT EXISTS groups (
+                    group_id INTEGER PRIMARY KEY,
+                    group_name TEXT
+                );
+                CREATE TABLE IF NOT EXISTS bypass_users (
+                    user_id INTEGER PRIMARY KEY
+                );
+                CREATE TABLE IF NOT EXISTS deletion_settings (
+                    group_id INTEGER PRIMARY KEY,
+                    enabled BOOLEAN NOT NULL DEFAULT 0,
+                    FOREIGN KEY(group_id) REFERENCES groups(group_id)
+                );
+                CREATE TABLE IF NOT EXISTS users (
+                    user_id INTEGER PRIMARY KEY,
+                    first_name TEXT,
+                    last_name TEXT,
+                    username TEXT
+                );
+                COMMIT;
+            ''')
         logger.info("Main DB tables initialized.")
 
         init_permissions_db()
+        with get_conn() as conn:
+            # Refresh planner statistics once per start; every table here is small, so this is cheap
+            conn.execute("ANALYZE")
+        load_caches()
+        warm_db_pool()
     except Exception as e:
-        logger.error(f"Failed to initialize DB: {e}")
+        logger.error("Failed to initialize DB: %s", e)
         raise
 
 # ------------------- DB Helpers -------------------
 
+# In-memory mirrors of the groups / bypass_users / deletion_settings tables for the per-message lookups.
+# Loaded by init_db() and kept in sync by the helpers that write those tables.
+group_ids = set()
+bypass_user_ids = set()
+deletion_enabled_groups = set()
+
+def load_caches():
+    with get_conn() as conn:
+        group_ids.clear()
+        group_ids.update(row[0] for row in conn.execute('SELECT group_id FROM groups'))
+        bypass_user_ids.clear()
+        bypass_user_ids.update(row[0] for row in conn.execute('SELECT user_id FROM bypass_users'))
+        deletion_enabled_groups.clear()
+        deletion_enabled_groups.update(row[0] for row in conn.execute('SELECT group_id FROM deletion_settings WHERE enabled'))
+    logger.info("Cached %d groups, %d bypassed users and %d groups with deletion enabled.",
+                len(group_ids), len(bypass_user_ids), len(deletion_enabled_groups))
+
 def add_group(group_id):
+    """Return False if the group was already registered."""
     try:
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute("INSERT OR IGNORE INTO groups (group_id, group_name) VALUES (?, ?)", (group_id, None))
-        conn.commit()
-        conn.close()
-        logger.info(f"Added group {group_id} to DB.")
+        with get_conn() as conn:
+            changes = conn.execute("INSERT OR IGNORE INTO groups (group_id, group_name) VALUES (?, ?)", (group_id, None)).rowcount
+        group_ids.add(group_id)
+        if changes > 0:
+            logger.info("Added group %s to DB.", group_id)
+            return True
+        return False
     except Exception as e:
-        logger.error(f"Error adding group {group_id}: {e}")
+        logger.error("Error adding group %s: %s", group_id, e)
         raise
 
 def set_group_name(group_id, name):
     try:
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute('UPDATE groups SET group_name=? WHERE group_id=?', (name, group_id))
-        conn.commit()
-        conn.close()
-        logger.info(f"Group {group_id} name set to '{name}'.")
+        with get_conn() as conn:
+            conn.execute('UPDATE groups SET group_name=? WHERE group_id=?', (name, group_id))
+        logger.info("Group %s name set to '%s'.", group_id, name)
     except Exception as e:
-        logger.error(f"Error setting name for group {group_id}: {e}")
+        logger.error("Error setting name for group %s: %s", group_id, e)
         raise
 
-def group_exists(group_id):
+def remove_group(group_id):
     try:
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute('SELECT 1 FROM groups WHERE group_id=?', (group_id,))
-        row = c.fetchone()
-        conn.close()
-        return bool(row)
+        with get_conn() as conn:
+            changes = conn.execute('DELETE FROM groups WHERE group_id=?', (group_id,)).rowcount
+        group_ids.discard(group_id)
+        if changes > 0:
+            logger.info("Removed group %s from DB.", group_id)
+            return True
+        else:
+            logger.warning("Group %s not found in DB.", group_id)
+            return False
     except Exception as e:
-        logger.error(f"Error checking group {group_id}: {e}")
-        return False
+        logger.error("Error removing group %s: %s", group_id, e)
+        raise
+
+def group_exists(group_id):
+    return group_id in group_ids
 
 def is_bypass_user(user_id):
-    try:
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute('SELECT 1 FROM bypass_users WHERE user_id=?', (user_id,))
-        row = c.fetchone()
-        conn.close()
-        return bool(row)
-    except Exception as e:
-        logger.error(f"Error checking bypass for user {user_id}: {e}")
-        return False
+    return user_id in bypass_user_ids
 
-def add_bypass_user(user_id):
+def add_bypass_users(user_ids):
+    """Add several users to the bypass list in one transaction."""
     try:
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute('INSERT OR IGNORE INTO bypass_users (user_id) VALUES (?)', (user_id,))
-        conn.commit()
-        conn.close()
-        logger.info(f"User {user_id} added to bypass list.")
+        with get_conn() as conn:
+            conn.executemany(
+                'INSERT OR IGNORE INTO bypass_users (user_id) VALUES (?)',
+                [(uid,) for uid in user_ids]
+            )
+        bypass_user_ids.update(user_ids)
+        logger.info("Users %s added to bypass list.", user_ids)
     except Exception as e:
-        logger.error(f"Error adding user {user_id} to bypass list: {e}")
+        logger.error("Error adding users %s to bypass list: %s", user_ids, e)
         raise
 
 def remove_bypass_user(user_id):
     try:
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute('DELETE FROM bypass_users WHERE user_id=?', (user_id,))
-        changes = c.rowcount
-        conn.commit()
-        conn.close()
+        with get_conn() as conn:
+            changes = conn.execute('DELETE FROM bypass_users WHERE user_id=?', (user_id,)).rowcount
+        bypass_user_ids.discard(user_id)
         if changes > 0:
-            logger.info(f"Removed user {user_id} from bypass list.")
+            logger.info("Removed user %s from bypass list.", user_id)
             return True
         else:
-            logger.warning(f"User {user_id} not found in bypass list.")
+            logger.warning("User %s not found in bypass list.", user_id)
             return False
     except Exception as e:
-        logger.error(f"Error removing user {user_id} from bypass list: {e}")
+        logger.error("Error removing user %s from bypass list: %s", user_id, e)
         return False
 
 def enable_deletion(group_id):
     try:
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute("""
-            INSERT INTO deletion_settings (group_id, enabled)
-            VALUES (?, 1)
-            ON CONFLICT(group_id) DO UPDATE SET enabled=1
-        """, (group_id,))
-        conn.commit()
-        conn.close()
-        logger.info(f"Enabled Arabic deletion for group {group_id}.")
+        with get_conn() as conn:
+            conn.execute("""
+                INSERT INTO deletion_settings (group_id, enabled)
+                VALUES (?, 1)
+                ON CONFLICT(group_id) DO UPDATE SET enabled=1
+            """, (group_id,))
+        deletion_enabled_groups.add(group_id)
+        logger.info("Enabled Arabic deletion for group %s.", group_id)
     except Exception as e:
-        logger.error(f"Error enabling deletion for group {group_id}: {e}")
+        logger.error("Error enabling deletion for group %s: %s", group_id, e)
         raise
 
 def disable_deletion(group_id):
     try:
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute("""
-            INSERT INTO deletion_settings (group_id, enabled)
-            VALUES (?, 0)
-            ON CONFLICT(group_id) DO UPDATE SET enabled=0
-        """, (group_id,))
-        conn.commit()
-        conn.close()
-        logger.info(f"Disabled Arabic deletion for group {group_id}.")
+        with get_conn() as conn:
+            conn.execute("""
+                INSERT INTO deletion_settings (group_id, enabled)
+                VALUES (?, 0)
+                ON CONFLICT(group_id) DO UPDATE SET enabled=0
+            """, (group_id,))
+        deletion_enabled_groups.discard(group_id)
+        logger.info("Disabled Arabic deletion for group %s.", group_id)
     except Exception as e:
-        logger.error(f"Error disabling deletion for group {group_id}: {e}")
+        logger.error("Error disabling deletion for group %s: %s", group_id, e)
         raise
 
 def is_deletion_enabled(group_id):
-    try:
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute('SELECT enabled FROM deletion_settings WHERE group_id=?', (group_id,))
-        row = c.fetchone()
-        conn.close()
-        return bool(row and row[0])
-    except Exception as e:
-        logger.error(f"Error checking deletion for group {group_id}: {e}")
-        return False
+    return group_id in deletion_enabled_groups
 
 def revoke_user_permissions(user_id):
     try:
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute('UPDATE permissions SET role=? WHERE user_id=?', ('removed', user_id))
-        conn.commit()
-        conn.close()
-        logger.info(f"Revoked permissions for user {user_id} (role='removed').")
+        with get_conn() as conn:
+            conn.execute('UPDATE permissions SET role=? WHERE user_id=?', ('removed', user_id))
+        logger.info("Revoked permissions for user %s (role='removed').", user_id)
     except Exception as e:
-        logger.error(f"Error revoking perms for user {user_id}: {e}")
+        logger.error("Error revoking perms for user %s: %s", user_id, e)
         raise
 
 def remove_user_from_removed_users(group_id, user_id):
     try:
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute('DELETE FROM removed_users WHERE group_id=? AND user_id=?', (group_id, user_id))
-        changes = c.rowcount
-        conn.commit()
-        conn.close()
+        with get_conn() as conn:
+            changes = conn.execute('DELETE FROM removed_users WHERE group_id=? AND user_id=?', (group_id, user_id)).rowcount
         if changes > 0:
-            logger.info(f"Removed user {user_id} from removed_users for group {group_id}.")
+            logger.info("Removed user %s from removed_users for group %s.", user_id, group_id)
             return True
         else:
-            logger.warning(f"User {user_id} not in removed_users for group {group_id}.")
+            logger.warning("User %s not in removed_users for group %s.", user_id, group_id)
             return False
     except Exception as e:
-        logger.error(f"Error removing user {user_id} from removed_users: {e}")
+        logger.error("Error removing user %s from removed_users: %s", user_id, e)
         return False
 
-def list_removed_users(group_id=None):
+def purge_user(group_id, user_id):
+    """Unbypass the user, drop their 'Removed Users' entry and revoke their role in one transaction."""
     try:
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        if group_id is None:
-            c.execute("""
-                SELECT group_id, user_id, removal_reason, removal_time
-                FROM removed_users
-            """)
-            rows = c.fetchall()
-        else:
-            c.execute("""
-                SELECT user_id, removal_reason, removal_time
-                FROM removed_users
-                WHERE group_id=?
-            """, (group_id,))
-            rows = c.fetchall()
-        conn.close()
-        logger.info("Fetched removed_users entries.")
-        return rows
+        with get_conn() as conn:
+            conn.execute('DELETE FROM bypass_users WHERE user_id=?', (user_id,))
+            conn.execute('DELETE FROM removed_users WHERE group_id=? AND user_id=?', (group_id, user_id))
+            conn.execute('UPDATE permissions SET role=? WHERE user_id=?', ('removed', user_id))
+        bypass_user_ids.discard(user_id)
+        logger.info("Purged user %s from bypass/removed_users/permissions for group %s.", user_id, group_id)
     except Exception as e:
-        logger.error(f"Error fetching removed_users: {e}")
-        return []
+        logger.error("Error purging user %s for group %s: %s", user_id, group_id, e)
+
+def removed_user_ids(group_id):
+    """Only the ids, for callers that just compare membership."""
+    try:
+        with get_conn() as conn:
+            rows = conn.execute("SELECT user_id FROM removed_users WHERE group_id=?", (group_id,))
+            return {row[0] for row in rows}
+    except Exception as e:
+        logger.error("Error fetching removed user ids for group %s: %s", group_id, e)
+        return set()
 
 delete_all_messages_after_removal = {}
 
+# ------------------- Access Control -------------------
+
+def admin_only(func):
+    """Silently ignore the update unless it comes from ALLOWED_USER_ID."""
+    @functools.wraps(func)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if update.effective_user.id != ALLOWED_USER_ID:
+            return
+        return await func(update, context)
+    return wrapper
+
+# ------------------- Concurrency -------------------
+
+def serialized_per_chat(func):
+    """Run the handler under its chat's lock so updates from one chat stay ordered."""
+    @functools.wraps(func)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        async with chat_locks[update.effective_chat.id]:
+            return await func(update, context)
+    return wrapper
+
+class OrjsonRequest(HTTPXRequest):
+    """HTTPXRequest that decodes Telegram's JSON responses with orjson."""
+
+    @staticmethod
+    def parse_json_payload(payload: bytes):
+        try:
+            return orjson.loads(payload)
+        except orjson.JSONDecodeError:
+            # Let PTB's own parser deal with (and report) malformed responses
+            return HTTPXRequest.parse_json_payload(payload)
+
+class SendRateLimiter(BaseRateLimiter):
+    """Token bucket that paces outgoing API calls instead of letting Telegram answer with 429s.
+    Sends are additionally spaced per chat, since Telegram also limits each chat separately."""
+
+    def __init__(self, rate=MAX_SENDS_PER_SECOND):
+        self._rate = rate
+        self._tokens = float(rate)
+        self._last_refill = 0.0
+        self._lock = None
+        self._chat_next_send = {}
+
+    async def initialize(self):
+        self._lock = asyncio.Lock()
+        self._last_refill = asyncio.get_running_loop().time()
+
+    async def shutdown(self):
+        pass
+
+    async def _take_token(self):
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            while True:
+                now = loop.time()
+                self._tokens = min(self._rate, self._tokens + (now - self._last_refill) * self._rate)
+                self._last_refill = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+
+    async def _wait_for_chat(self, chat_id):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        is_group = isinstance(chat_id, int) and chat_id < 0
+        slot = max(now, self._chat_next_send.get(chat_id, now))
+        self._chat_next_send[chat_id] = slot + (GROUP_SEND_INTERVAL if is_group else PRIVATE_SEND_INTERVAL)
+        if len(self._chat_next_send) > 1024:
+            self._chat_next_send = {k: t for k, t in self._chat_next_send.items() if t > now}
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        # Only send* methods count against the per-chat limits
+        if endpoint.startswith("send") and "chat_id" in data:
+            await self._wait_for_chat(data["chat_id"])
+        await self._take_token()
+        return await callback(*args, **kwargs)
+
+# ------------------- Message Templates -------------------
+
+# Same character class escape_markdown(version=2) builds on every call, compiled once
+_MD2_RE = re.compile(r"([\\_*\[\]()~`>#+\-=|{}.!])")
+
+@functools.lru_cache(maxsize=8192)
+def _md2_text(text):
+    return _MD2_RE.sub(r"\\\1", text)
+
+def md2(value):
+    """Escape a dynamic value for MarkdownV2. Text results are cached since names repeat."""
+    if type(value) is int:
+        # Digits never need escaping; only a group id's minus sign does
+        return str(value) if value >= 0 else "\\" + str(value)
+    return _md2_text(str(value))
+
+def md2_template(text):
+    """Escape a message once at import, keeping its positional {} fields for str.format."""
+    return escape_markdown(text, version=2).replace("\\{", "{").replace("\\}", "}")
+
+MESSAGE_CHUNK_LIMIT = 4000  # Telegram rejects messages over 4096 characters
+
+def iter_chunks(pieces, limit=MESSAGE_CHUNK_LIMIT):
+    """Pack pre-formatted pieces into as few chunks as possible, never splitting inside a piece."""
+    chunk = []
+    size = 0
+    for piece in pieces:
+        if chunk and size + len(piece) > limit:
+            yield "".join(chunk)
+            chunk = []
+            size = 0
+        chunk.append(piece)
+        size += len(piece)
+    if chunk:
+        yield "".join(chunk)
+
+async def send_chunked(bot, chat_id, pieces, limit=MESSAGE_CHUNK_LIMIT, **kwargs):
+    for text in iter_chunks(pieces, limit):
+        await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+
+MSG_BOT_RUNNING = md2_template("✅ Bot is running.")
+
+HELP_TEXT = md2(
+    "*Available Commands:*\n\n"
+    "• `/start` – Check if the bot is running.\n"
+    "• `/help` – Show help text.\n"
+    "• `/group_add <group_id>` – Register a group.\n"
+    "• `/rmove_group <group_id>` – Unregister a group.\n"
+    "• `/bypass <user_id>` – Add a user to bypass list.\n"
+    "• `/unbypass <user_id>` – Remove a user from bypass list.\n"
+    "• `/love <group_id> <user_id>` – Remove a user from 'Removed Users'.\n"
+    "• `/rmove_user <group_id> <user_id>` – Force remove user from group.\n"
+    "• `/mute <group_id> <user_id> <minutes>` – Mute user.\n"
+    "• `/unmute <group_id> <user_id>` – Unmute user.\n"
+    "• `/limit <group_id> <user_id> <permission_type> <on/off>` – Toggle user permission.\n"
+    "• `/slow <group_id> <seconds>` – Placeholder for slow mode.\n"
+    "• `/be_sad <group_id>` – Enable Arabic deletion.\n"
+    "• `/be_happy <group_id>` – Disable Arabic deletion.\n"
+    "• `/check <group_id>` – Validate 'Removed Users' vs actual membership.\n"
+    "• `/link <group_id>` – Create one-time invite link.\n"
+    "• `/permission_type` – Show valid `<permission_type>` for `/limit`.\n"
+    "• `/delete <group_id>` – Bot will ask for a link or message ID to delete.\n"
+    "• `/msg <group_id>` – Bot will ask you to type a message to send.\n"
+    "\n"
+    "*Note:* The bot must be *admin* with 'can_restrict_members' to effectively mute/limit,\n"
+    "and must be admin to delete messages or send messages in that group.\n"
+)
+
+MSG_GROUP_ID_NOT_INT = md2_template("⚠️ group_id must be integer.")
+MSG_USER_ID_NOT_INT = md2_template("⚠️ user_id must be integer.")
+
+USAGE_GROUP_ADD = md2_template("⚠️ Usage: `/group_add <group_id>`")
+MSG_GROUP_ALREADY_REGISTERED = md2_template("⚠️ That group is already registered.")
+MSG_GROUP_ADDED = md2_template("✅ Group `{}` added.\nNow send the group name in a message.")
+
+USAGE_RMOVE_GROUP = md2_template("⚠️ Usage: `/rmove_group <group_id>`")
+MSG_GROUP_REMOVED = md2_template("✅ Group `{}` removed.")
+MSG_GROUP_NOT_FOUND = md2_template("⚠️ Group `{}` not found.")
+MSG_GROUP_REMOVE_FAILED = md2_template("⚠️ Could not remove group. Check logs.")
+
+USAGE_BYPASS = md2_template("⚠️ Usage: `/bypass <user_id>`")
+MSG_USER_ALREADY_BYPASSED = md2_template("⚠️ User `{}` is already bypassed.")
+MSG_USER_BYPASSED = md2_template("✅ User `{}` added to bypass list.")
+MSG_BYPASS_FAILED = md2_template("⚠️ Could not bypass user. Check logs.")
+
+USAGE_UNBYPASS = md2_template("⚠️ Usage: `/unbypass <user_id>`")
+MSG_USER_UNBYPASSED = md2_template("✅ User `{}` removed from bypass list.")
+MSG_USER_NOT_BYPASSED = md2_template("⚠️ User `{}` not found in bypass list.")
+
+MSG_GROUP_NOT_REGISTERED = md2_template("⚠️ Group `{}` is not registered.")
+MSG_GROUP_NOT_REGISTERED_SHORT = md2_template("⚠️ Group `{}` not registered.")
+MSG_IDS_NOT_INT = md2_template("⚠️ Both group_id and user_id must be integers.")
+
+USAGE_LOVE = md2_template("⚠️ Usage: `/love <group_id> <user_id>`")
+MSG_USER_NOT_REMOVED = md2_template("⚠️ User `{}` is not in 'Removed Users' for group `{}`.")
+MSG_USER_LOVED = md2_template("✅ Loved user `{}` (removed from 'Removed Users') in group `{}`.")
+
+USAGE_RMOVE_USER = md2_template("⚠️ Usage: `/rmove_user <group_id> <user_id>`")
+MSG_BAN_FAILED = md2_template("⚠️ Could not ban `{}` from group `{}` (check bot perms).")
+MSG_USER_REMOVED = md2_template("✅ Removed `{}` from group `{}`.\nMessages for next {}s will be deleted.")
+
+USAGE_MUTE = md2_template("⚠️ Usage: `/mute <group_id> <user_id> <minutes>`")
+MSG_MUTE_ARGS_NOT_INT = md2_template("⚠️ group_id, user_id, & minutes must be integers.")
+MSG_USER_MUTED = md2_template("✅ Muted user `{}` in group `{}` for {} minute(s).")
+MSG_MUTE_FAILED = md2_template("⚠️ Could not mute. Bot must be admin with can_restrict_members.")
+
+USAGE_UNMUTE = md2_template("⚠️ Usage: `/unmute <group_id> <user_id>`")
+MSG_UNMUTE_IDS_NOT_INT = md2_template("⚠️ group_id, user_id must be integers.")
+MSG_USER_UNMUTED = md2_template("✅ Unmuted user `{}` in group `{}`.")
+MSG_UNMUTE_FAILED = md2_template("⚠️ Could not unmute. Bot must be admin with can_restrict_members.")
+
+VALID_PERMISSION_TYPES = [
+    "text",
+    "photos",
+    "videos",
+    "files",
+    "music",
+    "gifs",
+    "voice",
+    "video_messages",
+    "inlinebots",
+    "embed_links",
+    "polls",
+    "stickers",
+    "games"
+]
+
+USAGE_LIMIT = md2_template(
+    "⚠️ Usage: `/limit <group_id> <user_id> <permission_type> <on/off>`\n"
+    "e.g. /limit -10012345 999999 photos off\n\n"
+    "*Valid permission_type values:* " + ", ".join(VALID_PERMISSION_TYPES)
+)
+MSG_LIMIT_ARGS_INVALID = md2_template("⚠️ group_id & user_id must be int, then permission_type, then on/off.")
+MSG_NOT_SUPERGROUP = md2_template("⚠️ This group is type '{}'. Telegram restrictions typically require a supergroup.")
+MSG_CANNOT_RESTRICT_ADMIN = md2_template(
+    "⚠️ Cannot restrict user `{}` because they're an admin/creator.\n"
+    "Telegram does not allow restricting admins."
+)
+MSG_MEMBER_STATUS_FAILED = md2_template("⚠️ Could not fetch user status. Possibly user left or never was in the group?")
+MSG_UNKNOWN_PERMISSION_TYPE = md2_template(
+    "⚠️ Unknown permission_type.\n"
+    "Try one of: " + ", ".join(VALID_PERMISSION_TYPES)
+)
+MSG_PERMISSION_SET = md2_template(
+    "✅ Set permission '{}' to '{}' for `{}` in group `{}`.\n\n"
+    "If the user can still send the restricted content, ensure:\n"
+    "1) The user is not an admin.\n"
+    "2) The group is a supergroup.\n"
+    "3) The bot is admin with can_restrict_members.\n"
+)
+MSG_LIMIT_FAILED = md2_template(
+    "⚠️ Could not limit permission. Ensure the bot is admin with can_restrict_members.\n"
+    "Check logs for details."
+)
+PERMISSION_TYPES_TEXT = md2(
+    "*Possible `permission_type` values for `/limit`:*\n\n"
+    + "\n".join(f"• `{ptype}`" for ptype in VALID_PERMISSION_TYPES) + "\n\n"
+    "Example usage:\n"
+    "`/limit <group_id> <user_id> photos off`\n\n"
+    "This disallows that user from sending **photos** in the group.\n\n"
+    "Remember: The bot must be an admin with can_restrict_members for this to work."
+)
+
+USAGE_SLOW = md2_template("⚠️ Usage: `/slow <group_id> <delay_in_seconds>`")
+MSG_SLOW_ARGS_NOT_INT = md2_template("⚠️ group_id & delay must be int.")
+MSG_SLOW_UNSUPPORTED = md2_template("⚠️ No official method to set slow mode. (Placeholder only.)")
+
+MSG_GROUP_NAME_SET = md2_template("✅ Group `{}` name set to: *{}*")
+MSG_GROUP_NAME_FAILED = md2_template("⚠️ Could not set group name. Check logs.")
+
+USAGE_BE_SAD = md2_template("⚠️ Usage: `/be_sad <group_id>`")
+MSG_DELETION_ENABLED = md2_template("✅ Arabic deletion enabled for group `{}`.")
+MSG_ENABLE_DELETION_FAILED = md2_template("⚠️ Could not enable deletion. Check logs.")
+
+USAGE_BE_HAPPY = md2_template("⚠️ Usage: `/be_happy <group_id>`")
+MSG_DELETION_DISABLED = md2_template("✅ Arabic deletion disabled for group `{}`.")
+MSG_DISABLE_DELETION_FAILED = md2_template("⚠️ Could not disable deletion. Check logs.")
+
+USAGE_CHECK = md2_template("⚠️ Usage: `/check <group_id>`")
+CHECK_HEADER = md2_template("🔍 *Check Results:*\n\n")
+CHECK_NOT_IN_GROUP = md2_template("• Users not in group `{}` anymore:\n")
+CHECK_NONE_MISSING = md2_template("• No users missing from the group.\n\n")
+CHECK_STILL_IN = md2_template("• Users still in group `{}` who should be removed:\n")
+CHECK_AUTO_BAN = md2_template("\n🔨 Attempting to auto-ban these users...")
+CHECK_NO_DISCREPANCIES = md2_template("• No discrepancies found.")
+CHECK_USER_LINE = md2_template("  - `{}`\n")
+MSG_CHECK_FAILED = md2_template("⚠️ An error occurred while performing the check. Check logs for details.")
+
+USAGE_LINK = md2_template("⚠️ Usage: `/link <group_id>`")
+MSG_INVITE_LINK = md2_template("✅ One-time invite link for group `{}`:\n\n{}")
+MSG_LINK_FAILED = md2_template("⚠️ Could not create invite link. Check bot admin rights & logs.")
+
 # ------------------- Command Handlers -------------------
 
+@admin_only
 async def start_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    if user.id != ALLOWED_USER_ID:
-        return
     await context.bot.send_message(
         chat_id=user.id,
-        text=escape_markdown("✅ Bot is running.", version=2),
+        text=MSG_BOT_RUNNING,
         parse_mode='MarkdownV2'
     )
 
+@admin_only
 async def help_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    if user.id != ALLOWED_USER_ID:
-        return
-
-    help_text = (
-        "*Available Commands:*\n\n"
-        "• `/start` – Check if the bot is running.\n"
-        "• `/help` – Show help text.\n"
-        "• `/group_add <group_id>` – Register a group.\n"
-        "• `/rmove_group <group_id>` – Unregister a group.\n"
-        "• `/bypass <user_id>` – Add a user to bypass list.\n"
-        "• `/unbypass <user_id>` – Remove a user from bypass list.\n"
-        "• `/love <group_id> <user_id>` – Remove a user from 'Removed Users'.\n"
-        "• `/rmove_user <group_id> <user_id>` – Force remove user from group.\n"
-        "• `/mute <group_id> <user_id> <minutes>` – Mute user.\n"
-        "• `/unmute <group_id> <user_id>` – Unmute user.\n"
-        "• `/limit <group_id> <user_id> <permission_type> <on/off>` – Toggle user permission.\n"
-        "• `/slow <group_id> <seconds>` – Placeholder for slow mode.\n"
-        "• `/be_sad <group_id>` – Enable Arabic deletion.\n"
-        "• `/be_happy <group_id>` – Disable Arabic deletion.\n"
-        "• `/check <group_id>` – Validate 'Removed Users' vs actual membership.\n"
-        "• `/link <group_id>` – Create one-time invite link.\n"
-        "• `/permission_type` – Show valid `<permission_type>` for `/limit`.\n"
-        "• `/delete <group_id>` – Bot will ask for a link or message ID to delete.\n"
-        "• `/msg <group_id>` – Bot will ask you to type a message to send.\n"
-        "\n"
-        "*Note:* The bot must be *admin* with 'can_restrict_members' to effectively mute/limit,\n"
-        "and must be admin to delete messages or send messages in that group.\n"
-    )
-
-    await context.bot.send_message(
-        chat_id=user.id,
-        text=escape_markdown(help_text, version=2),
-        parse_mode='MarkdownV2'
-    )
+    await context.bot.send_message(chat_id=user.id, text=HELP_TEXT, parse_mode='MarkdownV2')
 
+@admin_only
 async def group_add_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    if user.id != ALLOWED_USER_ID:
-        return
-    if len(context.args) != 1:
-        msg = "⚠️ Usage: `/group_add <group_id>`"
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(msg, version=2), parse_mode='MarkdownV2')
+    try:
+        (raw,) = context.args
+    except ValueError:
+        await context.bot.send_message(chat_id=user.id, text=USAGE_GROUP_ADD, parse_mode='MarkdownV2')
         return
 
     try:
-        g_id = int(context.args[0])
+        g_id = int(raw)
     except ValueError:
-        w = "⚠️ group_id must be integer."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(w, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=MSG_GROUP_ID_NOT_INT, parse_mode='MarkdownV2')
         return
 
-    if group_exists(g_id):
-        wr = "⚠️ That group is already registered."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(wr, version=2), parse_mode='MarkdownV2')
+    if not await asyncio.to_thread(add_group, g_id):
+        await context.bot.send_message(chat_id=user.id, text=MSG_GROUP_ALREADY_REGISTERED, parse_mode='MarkdownV2')
         return
 
-    add_group(g_id)
-    pending_group_names[user.id] = g_id
-    confirm = f"✅ Group `{g_id}` added.\nNow send the group name in a message."
-    await context.bot.send_message(chat_id=user.id, text=escape_markdown(confirm, version=2), parse_mode='MarkdownV2')
+    set_pending_group_name(user.id, g_id)
+    await context.bot.send_message(chat_id=user.id, text=MSG_GROUP_ADDED.format(md2(g_id)), parse_mode='MarkdownV2')
 
+@admin_only
 async def rmove_group_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    if user.id != ALLOWED_USER_ID:
-        return
-    if len(context.args) != 1:
-        msg = "⚠️ Usage: `/rmove_group <group_id>`"
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(msg, version=2), parse_mode='MarkdownV2')
+    try:
+        (raw,) = context.args
+    except ValueError:
+        await context.bot.send_message(chat_id=user.id, text=USAGE_RMOVE_GROUP, parse_mode='MarkdownV2')
         return
+
     try:
-        g_id = int(context.args[0])
-    except:
-        w = "⚠️ group_id must be integer."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(w, version=2), parse_mode='MarkdownV2')
+        g_id = int(raw)
+    except ValueError:
+        await context.bot.send_message(chat_id=user.id, text=MSG_GROUP_ID_NOT_INT, parse_mode='MarkdownV2')
         return
 
     try:
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute('DELETE FROM groups WHERE group_id=?', (g_id,))
-        changes = c.rowcount
-        conn.commit()
-        conn.close()
-        if changes > 0:
-            cf = f"✅ Group `{g_id}` removed."
-            await context.bot.send_message(chat_id=user.id, text=escape_markdown(cf, version=2), parse_mode='MarkdownV2')
+        if await asyncio.to_thread(remove_group, g_id):
+            await context.bot.send_message(chat_id=user.id, text=MSG_GROUP_REMOVED.format(md2(g_id)), parse_mode='MarkdownV2')
         else:
-            wr = f"⚠️ Group `{g_id}` not found."
-            await context.bot.send_message(chat_id=user.id, text=escape_markdown(wr, version=2), parse_mode='MarkdownV2')
+            await context.bot.send_message(chat_id=user.id, text=MSG_GROUP_NOT_FOUND.format(md2(g_id)), parse_mode='MarkdownV2')
     except Exception as e:
-        logger.error(f"Error removing group {g_id}: {e}")
-        msg = "⚠️ Could not remove group. Check logs."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(msg, version=2), parse_mode='MarkdownV2')
+        logger.error("Error removing group %s: %s", g_id, e)
+        await context.bot.send_message(chat_id=user.id, text=MSG_GROUP_REMOVE_FAILED, parse_mode='MarkdownV2')
 
+@admin_only
 async def bypass_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    if user.id != ALLOWED_USER_ID:
-        return
 
-    if len(context.args) != 1:
-        msg = "⚠️ Usage: `/bypass <user_id>`"
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(msg, version=2), parse_mode='MarkdownV2')
+    try:
+        (raw,) = context.args
+    except ValueError:
+        await context.bot.send_message(chat_id=user.id, text=USAGE_BYPASS, parse_mode='MarkdownV2')
         return
 
     try:
-        uid = int(context.args[0])
-    except:
-        wr = "⚠️ user_id must be integer."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(wr, version=2), parse_mode='MarkdownV2')
+        uid = int(raw)
+    except ValueError:
+        await context.bot.send_message(chat_id=user.id, text=MSG_USER_ID_NOT_INT, parse_mode='MarkdownV2')
         return
 
     if is_bypass_user(uid):
-        wr = f"⚠️ User `{uid}` is already bypassed."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(wr, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=MSG_USER_ALREADY_BYPASSED.format(md2(uid)), parse_mode='MarkdownV2')
         return
 
     try:
-        add_bypass_user(uid)
-        cf = f"✅ User `{uid}` added to bypass list."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(cf, version=2), parse_mode='MarkdownV2')
+        await asyncio.to_thread(add_bypass_users, [uid])
+        await context.bot.send_message(chat_id=user.id, text=MSG_USER_BYPASSED.format(md2(uid)), parse_mode='MarkdownV2')
     except Exception as e:
-        logger.error(f"Error bypassing {uid}: {e}")
-        err = "⚠️ Could not bypass user. Check logs."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(err, version=2), parse_mode='MarkdownV2')
+        logger.error("Error bypassing %s: %s", uid, e)
+        await context.bot.send_message(chat_id=user.id, text=MSG_BYPASS_FAILED, parse_mode='MarkdownV2')
 
+@admin_only
 async def unbypass_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    if user.id != ALLOWED_USER_ID:
-        return
 
-    if len(context.args) != 1:
-        msg = "⚠️ Usage: `/unbypass <user_id>`"
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(msg, version=2), parse_mode='MarkdownV2')
+    try:
+        (raw,) = context.args
+    except ValueError:
+        await context.bot.send_message(chat_id=user.id, text=USAGE_UNBYPASS, parse_mode='MarkdownV2')
         return
 
     try:
-        uid = int(context.args[0])
-    except:
-        wr = "⚠️ user_id must be integer."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(wr, version=2), parse_mode='MarkdownV2')
+        uid = int(raw)
+    except ValueError:
+        await context.bot.send_message(chat_id=user.id, text=MSG_USER_ID_NOT_INT, parse_mode='MarkdownV2')
         return
 
-    removed = remove_bypass_user(uid)
+    removed = await asyncio.to_thread(remove_bypass_user, uid)
     if removed:
-        cf = f"✅ User `{uid}` removed from bypass list."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(cf, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=MSG_USER_UNBYPASSED.format(md2(uid)), parse_mode='MarkdownV2')
     else:
-        wr = f"⚠️ User `{uid}` not found in bypass list."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(wr, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=MSG_USER_NOT_BYPASSED.format(md2(uid)), parse_mode='MarkdownV2')
 
+@admin_only
 async def love_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    if user.id != ALLOWED_USER_ID:
-        return
 
     if len(context.args) != 2:
-        msg = "⚠️ Usage: `/love <group_id> <user_id>`"
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(msg, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=USAGE_LOVE, parse_mode='MarkdownV2')
         return
 
     try:
         g_id = int(context.args[0])
         u_id = int(context.args[1])
     except:
-        e = "⚠️ Both group_id and user_id must be integers."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(e, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=MSG_IDS_NOT_INT, parse_mode='MarkdownV2')
         return
 
     if not group_exists(g_id):
-        wr = f"⚠️ Group `{g_id}` is not registered."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(wr, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=MSG_GROUP_NOT_REGISTERED.format(md2(g_id)), parse_mode='MarkdownV2')
         return
 
-    removed = remove_user_from_removed_users(g_id, u_id)
+    removed = await asyncio.to_thread(remove_user_from_removed_users, g_id, u_id)
     if not removed:
-        wr = f"⚠️ User `{u_id}` is not in 'Removed Users' for group `{g_id}`."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(wr, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=MSG_USER_NOT_REMOVED.format(md2(u_id), md2(g_id)), parse_mode='MarkdownV2')
         return
 
     try:
-        revoke_user_permissions(u_id)
+        await asyncio.to_thread(revoke_user_permissions, u_id)
     except Exception as e:
-        logger.error(f"Error revoking perms for {u_id}: {e}")
+        logger.error("Error revoking perms for %s: %s", u_id, e)
 
-    cf = f"✅ Loved user `{u_id}` (removed from 'Removed Users') in group `{g_id}`."
-    await context.bot.send_message(chat_id=user.id, text=escape_markdown(cf, version=2), parse_mode='MarkdownV2')
+    await context.bot.send_message(chat_id=user.id, text=MSG_USER_LOVED.format(md2(u_id), md2(g_id)), parse_mode='MarkdownV2')
 
+@admin_only
 async def rmove_user_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    if user.id != ALLOWED_USER_ID:
-        return
 
     if len(context.args) != 2:
-        msg = "⚠️ Usage: `/rmove_user <group_id> <user_id>`"
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(msg, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=USAGE_RMOVE_USER, parse_mode='MarkdownV2')
         return
 
     try:
         g_id = int(context.args[0])
         u_id = int(context.args[1])
     except:
-        e = "⚠️ Both group_id and user_id must be integers."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(e, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=MSG_IDS_NOT_INT, parse_mode='MarkdownV2')
         return
 
-    remove_bypass_user(u_id)
-    remove_user_from_removed_users(g_id, u_id)
-    try:
-        revoke_user_permissions(u_id)
-    except Exception as e:
-        logger.error(f"Revoke perms failed for {u_id}: {e}")
+    await asyncio.to_thread(purge_user, g_id, u_id)
 
     try:
         await context.bot.ban_chat_member(chat_id=g_id, user_id=u_id)
     except Exception as e:
-        err = f"⚠️ Could not ban `{u_id}` from group `{g_id}` (check bot perms)."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(err, version=2), parse_mode='MarkdownV2')
-        logger.error(f"Ban error for {u_id} in {g_id}: {e}")
+        await context.bot.send_message(chat_id=user.id, text=MSG_BAN_FAILED.format(md2(u_id), md2(g_id)), parse_mode='MarkdownV2')
+        logger.error("Ban error for %s in %s: %s", u_id, g_id, e)
         return
 
     delete_all_messages_after_removal[g_id] = datetime.utcnow() + timedelta(seconds=MESSAGE_DELETE_TIMEFRAME)
     asyncio.create_task(remove_deletion_flag_after_timeout(g_id))
 
-    cf = f"✅ Removed `{u_id}` from group `{g_id}`.\nMessages for next {MESSAGE_DELETE_TIMEFRAME}s will be deleted."
-    await context.bot.send_message(chat_id=user.id, text=escape_markdown(cf, version=2), parse_mode='MarkdownV2')
+    await context.bot.send_message(chat_id=user.id, text=MSG_USER_REMOVED.format(md2(u_id), md2(g_id), md2(MESSAGE_DELETE_TIMEFRAME)), parse_mode='MarkdownV2')
 
+@admin_only
 async def mute_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    if user.id != ALLOWED_USER_ID:
-        return
 
     if len(context.args) != 3:
-        msg = "⚠️ Usage: `/mute <group_id> <user_id> <minutes>`"
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(msg, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=USAGE_MUTE, parse_mode='MarkdownV2')
         return
 
     try:
@@ -592,13 +917,11 @@ async def mute_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         u_id = int(context.args[1])
         minutes = int(context.args[2])
     except:
-        w = "⚠️ group_id, user_id, & minutes must be integers."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(w, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=MSG_MUTE_ARGS_NOT_INT, parse_mode='MarkdownV2')
         return
 
     if not group_exists(g_id):
-        ef = f"⚠️ Group `{g_id}` not registered."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(ef, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=MSG_GROUP_NOT_REGISTERED_SHORT.format(md2(g_id)), parse_mode='MarkdownV2')
         return
 
     until_date = datetime.utcnow() + timedelta(minutes=minutes)
@@ -606,34 +929,28 @@ async def mute_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     try:
         await context.bot.restrict_chat_member(chat_id=g_id, user_id=u_id, permissions=perms, until_date=until_date)
-        cf = f"✅ Muted user `{u_id}` in group `{g_id}` for {minutes} minute(s)."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(cf, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=MSG_USER_MUTED.format(md2(u_id), md2(g_id), md2(minutes)), parse_mode='MarkdownV2')
     except Exception as e:
-        logger.error(f"Error muting user {u_id} in {g_id}: {e}")
-        err = "⚠️ Could not mute. Bot must be admin with can_restrict_members."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(err, version=2), parse_mode='MarkdownV2')
+        logger.error("Error muting user %s in %s: %s", u_id, g_id, e)
+        await context.bot.send_message(chat_id=user.id, text=MSG_MUTE_FAILED, parse_mode='MarkdownV2')
 
+@admin_only
 async def unmute_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    if user.id != ALLOWED_USER_ID:
-        return
 
     if len(context.args) != 2:
-        msg = "⚠️ Usage: `/unmute <group_id> <user_id>`"
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(msg, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=USAGE_UNMUTE, parse_mode='MarkdownV2')
         return
 
     try:
         g_id = int(context.args[0])
         u_id = int(context.args[1])
     except ValueError:
-        w = "⚠️ group_id, user_id must be integers."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(w, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=MSG_UNMUTE_IDS_NOT_INT, parse_mode='MarkdownV2')
         return
 
     if not group_exists(g_id):
-        ef = f"⚠️ Group `{g_id}` is not registered."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(ef, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=MSG_GROUP_NOT_REGISTERED.format(md2(g_id)), parse_mode='MarkdownV2')
         return
 
     perms = ChatPermissions(
@@ -646,41 +963,17 @@ async def unmute_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     try:
         await context.bot.restrict_chat_member(chat_id=g_id, user_id=u_id, permissions=perms)
-        cf = f"✅ Unmuted user `{u_id}` in group `{g_id}`."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(cf, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=MSG_USER_UNMUTED.format(md2(u_id), md2(g_id)), parse_mode='MarkdownV2')
     except Exception as e:
-        logger.error(f"Error unmuting user {u_id} in group {g_id}: {e}")
-        err = "⚠️ Could not unmute. Bot must be admin with can_restrict_members."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(err, version=2), parse_mode='MarkdownV2')
-
-VALID_PERMISSION_TYPES = [
-    "text",
-    "photos",
-    "videos",
-    "files",
-    "music",
-    "gifs",
-    "voice",
-    "video_messages",
-    "inlinebots",
-    "embed_links",
-    "polls",
-    "stickers",
-    "games"
-]
+        logger.error("Error unmuting user %s in group %s: %s", u_id, g_id, e)
+        await context.bot.send_message(chat_id=user.id, text=MSG_UNMUTE_FAILED, parse_mode='MarkdownV2')
 
+@admin_only
 async def limit_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    if user.id != ALLOWED_USER_ID:
-        return
 
     if len(context.args) != 4:
-        msg = (
-            "⚠️ Usage: `/limit <group_id> <user_id> <permission_type> <on/off>`\n"
-            "e.g. /limit -10012345 999999 photos off\n\n"
-            "*Valid permission_type values:* " + ", ".join(VALID_PERMISSION_TYPES)
-        )
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(msg, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=USAGE_LIMIT, parse_mode='MarkdownV2')
         return
 
     try:
@@ -689,36 +982,28 @@ async def limit_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         p_type = context.args[2].lower().strip()
         toggle = context.args[3].lower().strip()
     except:
-        wr = "⚠️ group_id & user_id must be int, then permission_type, then on/off."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(wr, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=MSG_LIMIT_ARGS_INVALID, parse_mode='MarkdownV2')
         return
 
     if not group_exists(g_id):
-        w = f"⚠️ Group `{g_id}` not registered."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(w, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=MSG_GROUP_NOT_REGISTERED_SHORT.format(md2(g_id)), parse_mode='MarkdownV2')
         return
 
     try:
         chat_info = await context.bot.get_chat(g_id)
-        if chat_info.type != "supergroup":
-            note = f"⚠️ This group is type '{chat_info.type}'. Telegram restrictions typically require a supergroup."
-            await context.bot.send_message(chat_id=user.id, text=escape_markdown(note, version=2), parse_mode='MarkdownV2')
+        if chat_info.type is not ChatType.SUPERGROUP:
+            await context.bot.send_message(chat_id=user.id, text=MSG_NOT_SUPERGROUP.format(md2(chat_info.type)), parse_mode='MarkdownV2')
     except Exception as e:
-        logger.error(f"Error get_chat for group {g_id}: {e}")
+        logger.error("Error get_chat for group %s: %s", g_id, e)
 
     try:
         target_member = await context.bot.get_chat_member(chat_id=g_id, user_id=u_id)
         if target_member.status in ["administrator", "creator"]:
-            wr = (
-                f"⚠️ Cannot restrict user `{u_id}` because they're an admin/creator.\n"
-                "Telegram does not allow restricting admins."
-            )
-            await context.bot.send_message(chat_id=user.id, text=escape_markdown(wr, version=2), parse_mode='MarkdownV2')
+            await context.bot.send_message(chat_id=user.id, text=MSG_CANNOT_RESTRICT_ADMIN.format(md2(u_id)), parse_mode='MarkdownV2')
             return
     except Exception as e:
-        logger.error(f"Error get_chat_member for {u_id} in group {g_id}: {e}")
-        wr = "⚠️ Could not fetch user status. Possibly user left or never was in the group?"
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(wr, version=2), parse_mode='MarkdownV2')
+        logger.error("Error get_chat_member for %s in group %s: %s", u_id, g_id, e)
+        await context.bot.send_message(chat_id=user.id, text=MSG_MEMBER_STATUS_FAILED, parse_mode='MarkdownV2')
         return
 
     def off():
@@ -743,11 +1028,7 @@ async def limit_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if off():
             can_send_messages = False
     else:
-        wr = (
-            "⚠️ Unknown permission_type.\n"
-            "Try one of: " + ", ".join(VALID_PERMISSION_TYPES)
-        )
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(wr, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=MSG_UNKNOWN_PERMISSION_TYPE, parse_mode='MarkdownV2')
         return
 
     perms = ChatPermissions(
@@ -760,76 +1041,51 @@ async def limit_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     try:
         await context.bot.restrict_chat_member(chat_id=g_id, user_id=u_id, permissions=perms)
-        msg = (
-            f"✅ Set permission '{p_type}' to '{toggle}' for `{u_id}` in group `{g_id}`.\n\n"
-            "If the user can still send the restricted content, ensure:\n"
-            "1) The user is not an admin.\n"
-            "2) The group is a supergroup.\n"
-            "3) The bot is admin with can_restrict_members.\n"
-        )
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(msg, version=2), parse_mode='MarkdownV2')
+        cf = MSG_PERMISSION_SET.format(md2(p_type), md2(toggle), md2(u_id), md2(g_id))
+        await context.bot.send_message(chat_id=user.id, text=cf, parse_mode='MarkdownV2')
     except Exception as e:
-        logger.error(f"Error limiting perms for {u_id} in {g_id}: {e}")
-        err = (
-            "⚠️ Could not limit permission. Ensure the bot is admin with can_restrict_members.\n"
-            "Check logs for details."
-        )
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(err, version=2), parse_mode='MarkdownV2')
+        logger.error("Error limiting perms for %s in %s: %s", u_id, g_id, e)
+        await context.bot.send_message(chat_id=user.id, text=MSG_LIMIT_FAILED, parse_mode='MarkdownV2')
 
+@admin_only
 async def slow_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    if user.id != ALLOWED_USER_ID:
-        return
 
     if len(context.args) != 2:
-        msg = "⚠️ Usage: `/slow <group_id> <delay_in_seconds>`"
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(msg, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=USAGE_SLOW, parse_mode='MarkdownV2')
         return
 
     try:
         g_id = int(context.args[0])
         delay = int(context.args[1])
     except:
-        w = "⚠️ group_id & delay must be int."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(w, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=MSG_SLOW_ARGS_NOT_INT, parse_mode='MarkdownV2')
         return
 
     if not group_exists(g_id):
-        e = f"⚠️ Group `{g_id}` not registered."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(e, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=MSG_GROUP_NOT_REGISTERED_SHORT.format(md2(g_id)), parse_mode='MarkdownV2')
         return
 
     logger.warning("Setting slow mode is not supported by Bot API. Placeholder only.")
-    note = "⚠️ No official method to set slow mode. (Placeholder only.)"
-    await context.bot.send_message(chat_id=user.id, text=escape_markdown(note, version=2), parse_mode='MarkdownV2')
+    await context.bot.send_message(chat_id=user.id, text=MSG_SLOW_UNSUPPORTED, parse_mode='MarkdownV2')
 
+@admin_only
 async def permission_type_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    if user.id != ALLOWED_USER_ID:
-        return
-
-    types_list = "\n".join([f"• `{ptype}`" for ptype in VALID_PERMISSION_TYPES])
-    message = (
-        "*Possible `permission_type` values for `/limit`:*\n\n"
-        f"{types_list}\n\n"
-        "Example usage:\n"
-        "`/limit <group_id> <user_id> photos off`\n\n"
-        "This disallows that user from sending **photos** in the group.\n\n"
-        "Remember: The bot must be an admin with can_restrict_members for this to work."
-    )
-
-    await context.bot.send_message(
-        chat_id=user.id,
-        text=escape_markdown(message, version=2),
-        parse_mode='MarkdownV2'
-    )
+    await context.bot.send_message(chat_id=user.id, text=PERMISSION_TYPES_TEXT, parse_mode='MarkdownV2')
 
 # ------------------- /delete & /msg Command Handlers -------------------
 
+@dataclass(slots=True)
+class UserFlow:
+    mode: str  # "delete" or "msg"
+    step: str
+    group_id: int
+    draft_text: str = ""
+
+@admin_only
 async def delete_cmd_flow(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    if user.id != ALLOWED_USER_ID:
-        return
 
     if len(context.args) != 1:
         msg = "⚠️ Usage: `/delete <group_id>`"
@@ -842,11 +1098,7 @@ async def delete_cmd_flow(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await context.bot.send_message(chat_id=user.id, text="⚠️ group_id must be integer.")
         return
 
-    user_flows[user.id] = {
-        "mode": "delete",
-        "step": "await_link",
-        "group_id": group_id
-    }
+    user_flows[user.id] = UserFlow(mode="delete", step="await_link", group_id=group_id)
 
     prompt = (
         f"Please send me the *link* (like `https://t.me/c/123456789/1000`) or the *message ID* "
@@ -854,10 +1106,9 @@ async def delete_cmd_flow(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     await context.bot.send_message(chat_id=user.id, text=prompt, parse_mode='Markdown')
 
+@admin_only
 async def msg_cmd_flow(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    if user.id != ALLOWED_USER_ID:
-        return
     if len(context.args) != 1:
         msg = "⚠️ Usage: `/msg <group_id>`"
         await context.bot.send_message(chat_id=user.id, text=msg)
@@ -869,11 +1120,7 @@ async def msg_cmd_flow(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await context.bot.send_message(chat_id=user.id, text="⚠️ group_id must be integer.")
         return
 
-    user_flows[user.id] = {
-        "mode": "msg",
-        "step": "await_text",
-        "group_id": group_id
-    }
+    user_flows[user.id] = UserFlow(mode="msg", step="await_text", group_id=group_id)
 
     txt = f"Please type the message you want to send to group `{group_id}`."
     await context.bot.send_message(chat_id=user.id, text=txt)
@@ -886,6 +1133,24 @@ def parse_message_link(link_text: str):
 
 # ------------------- Handler for Next Message (Name, Link, or Msg) -------------------
 
+def set_pending_group_name(user_id, group_id):
+    pending_group_names.pop(user_id, None)
+    pending_group_names[user_id] = (group_id, time.monotonic() + PENDING_NAME_TTL)
+    while len(pending_group_names) > PENDING_NAME_MAX:
+        pending_group_names.popitem(last=False)
+
+def pop_pending_group_name(user_id):
+    """Return the group waiting for a name from this user, or None if none is pending or it expired."""
+    entry = pending_group_names.pop(user_id, None)
+    if entry is None:
+        return None
+    group_id, deadline = entry
+    if time.monotonic() > deadline:
+        return None
+    return group_id
+
+@admin_only
+@serialized_per_chat
 async def handle_next_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Catch-all for text messages from the authorized user (private chat).
@@ -894,32 +1159,28 @@ async def handle_next_message(update: Update, context: ContextTypes.DEFAULT_TYPE
     3) If user is in a flow for /msg, handle text & confirm.
     """
     user = update.effective_user
-    if user.id != ALLOWED_USER_ID:
-        return
 
     text = (update.message.text or "").strip()
     if not text:
         return
 
     # 1) Are we waiting for group name?
-    if user.id in pending_group_names:
-        group_id = pending_group_names.pop(user.id)
+    group_id = pop_pending_group_name(user.id)
+    if group_id is not None:
         try:
-            set_group_name(group_id, text)
-            msg = f"✅ Group `{group_id}` name set to: *{text}*"
-            await context.bot.send_message(chat_id=user.id, text=escape_markdown(msg, version=2), parse_mode='MarkdownV2')
+            await asyncio.to_thread(set_group_name, group_id, text)
+            await context.bot.send_message(chat_id=user.id, text=MSG_GROUP_NAME_SET.format(md2(group_id), md2(text)), parse_mode='MarkdownV2')
         except Exception as e:
-            logger.error(f"Error setting group name for {group_id}: {e}")
-            err = "⚠️ Could not set group name. Check logs."
-            await context.bot.send_message(chat_id=user.id, text=escape_markdown(err, version=2), parse_mode='MarkdownV2')
+            logger.error("Error setting group name for %s: %s", group_id, e)
+            await context.bot.send_message(chat_id=user.id, text=MSG_GROUP_NAME_FAILED, parse_mode='MarkdownV2')
         return
 
     # 2) Are we in a user flow for /delete or /msg?
-    if user.id in user_flows:
-        flow = user_flows[user.id]
-        mode = flow.get("mode")
-        step = flow.get("step")
-        group_id = flow.get("group_id")
+    flow = user_flows.get(user.id)
+    if flow is not None:
+        mode = flow.mode
+        step = flow.step
+        group_id = flow.group_id
 
         # /delete flow
         if mode == "delete" and step == "await_link":
@@ -945,7 +1206,7 @@ async def handle_next_message(update: Update, context: ContextTypes.DEFAULT_TYPE
                         text=f"✅ Deleted message {msg_id} in group `{group_id}`."
                     )
                 except Exception as e:
-                    logger.error(f"Error deleting message {msg_id} in group {group_id}: {e}")
+                    logger.error("Error deleting message %s in group %s: %s", msg_id, group_id, e)
                     await context.bot.send_message(
                         chat_id=user.id,
                         text="⚠️ Could not delete. Check if the bot is admin or if message ID is valid."
@@ -956,9 +1217,8 @@ async def handle_next_message(update: Update, context: ContextTypes.DEFAULT_TYPE
         # /msg flow
         elif mode == "msg":
             if step == "await_text":
-                flow["draft_text"] = text
-                flow["step"] = "await_confirm"
-                user_flows[user.id] = flow
+                flow.draft_text = text
+                flow.step = "await_confirm"
                 confirm = (
                     f"Are you sure you want to send the following text to group `{group_id}`?\n\n"
                     f"\"{text}\"\n\n"
@@ -969,12 +1229,12 @@ async def handle_next_message(update: Update, context: ContextTypes.DEFAULT_TYPE
 
             elif step == "await_confirm":
                 if text.lower() in ["yes", "y"]:
-                    final_text = flow.get("draft_text", "")
+                    final_text = flow.draft_text
                     try:
                         await context.bot.send_message(chat_id=group_id, text=final_text)
                         await context.bot.send_message(chat_id=user.id, text="✅ Message sent successfully.")
                     except Exception as e:
-                        logger.error(f"Error sending message to group {group_id}: {e}")
+                        logger.error("Error sending message to group %s: %s", group_id, e)
                         await context.bot.send_message(
                             chat_id=user.id,
                             text="⚠️ Could not send. Check if the bot is admin or group ID is valid."
@@ -989,8 +1249,12 @@ async def handle_next_message(update: Update, context: ContextTypes.DEFAULT_TYPE
 
 # ------------------- Deletion / Filtering Handlers -------------------
 
+# Arabic, Arabic Supplement and both presentation-form blocks (FEFF is the BOM, so Forms-B stops at FEFC)
+_ARABIC_RE = re.compile(r'[\u0600-\u06FF\u0750-\u077F\uFB50-\uFDFF\uFE70-\uFEFC]')
+
 def has_arabic(text):
-    return bool(re.search(r'[\u0600-\u06FF]', text))
+    # ASCII-only text (plain English, digits) cannot contain Arabic; isascii() skips the regex
+    return not text.isascii() and _ARABIC_RE.search(text) is not None
 
 async def delete_arabic_messages(update: Update, context: ContextTypes.DEFAULT_TYPE):
     msg = update.message
@@ -998,18 +1262,18 @@ async def delete_arabic_messages(update: Update, context: ContextTypes.DEFAULT_T
         return
     user = msg.from_user
     chat_id = msg.chat.id
-    if not is_deletion_enabled(chat_id):
-        return
     if is_bypass_user(user.id):
         return
+    if not is_deletion_enabled(chat_id):
+        return
 
     text_or_caption = (msg.text or msg.caption or "")
     if text_or_caption and has_arabic(text_or_caption):
         try:
             await msg.delete()
-            logger.info(f"Deleted Arabic from user {user.id} in group {chat_id}.")
+            logger.info("Deleted Arabic from user %s in group %s.", user.id, chat_id)
         except Exception as e:
-            logger.error(f"Error deleting Arabic message: {e}")
+            logger.error("Error deleting Arabic message: %s", e)
         return
 
     if msg.document and msg.document.file_name and msg.document.file_name.lower().endswith('.pdf'):
@@ -1023,16 +1287,14 @@ async def delete_arabic_messages(update: Update, context: ContextTypes.DEFAULT_T
                     with open(tmp_pdf.name, 'rb') as pdf_file:
                         try:
                             reader = PyPDF2.PdfReader(pdf_file)
-                            all_text = ""
-                            for page in reader.pages:
-                                all_text += page.extract_text() or ""
-                            if has_arabic(all_text):
+                            # Page by page, so extraction stops at the first page with Arabic
+                            if any(has_arabic(page.extract_text() or "") for page in reader.pages):
                                 await msg.delete()
-                                logger.info(f"Deleted PDF with Arabic from user {user.id} in group {chat_id}.")
+                                logger.info("Deleted PDF with Arabic from user %s in group %s.", user.id, chat_id)
                         except Exception as e:
-                            logger.error(f"PyPDF2 read error: {e}")
+                            logger.error("PyPDF2 read error: %s", e)
                 except Exception as e:
-                    logger.error(f"PDF parse error: {e}")
+                    logger.error("PDF parse error: %s", e)
                 finally:
                     try:
                         os.remove(tmp_pdf.name)
@@ -1051,9 +1313,9 @@ async def delete_arabic_messages(update: Update, context: ContextTypes.DEFAULT_T
                     extracted = pytesseract.image_to_string(Image.open(tmp_img.name)) or ""
                     if has_arabic(extracted):
                         await msg.delete()
-                        logger.info(f"Deleted image with Arabic from user {user.id} in group {chat_id}.")
+                        logger.info("Deleted image with Arabic from user %s in group %s.", user.id, chat_id)
                 except Exception as e:
-                    logger.error(f"OCR error: {e}")
+                    logger.error("OCR error: %s", e)
                 finally:
                     try:
                         os.remove(tmp_img.name)
@@ -1061,186 +1323,185 @@ async def delete_arabic_messages(update: Update, context: ContextTypes.DEFAULT_T
                         pass
 
 async def delete_any_messages(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Return True if the message was deleted because of a recent /rmove_user."""
     msg = update.message
     if not msg:
-        return
+        return False
     chat_id = msg.chat.id
-    if chat_id in delete_all_messages_after_removal:
-        expiry = delete_all_messages_after_removal[chat_id]
-        if datetime.utcnow() > expiry:
-            delete_all_messages_after_removal.pop(chat_id, None)
-            logger.info(f"Short-term deletion expired for {chat_id}.")
-            return
-        try:
-            await msg.delete()
-            logger.info(f"Deleted a message in group {chat_id} (short-term).")
-        except Exception as e:
-            logger.error(f"Failed to delete flagged message in {chat_id}: {e}")
+    expiry = delete_all_messages_after_removal.get(chat_id)
+    if expiry is None:
+        return False
+    if datetime.utcnow() > expiry:
+        delete_all_messages_after_removal.pop(chat_id, None)
+        logger.info("Short-term deletion expired for %s.", chat_id)
+        return False
+    try:
+        await msg.delete()
+        logger.info("Deleted a message in group %s (short-term).", chat_id)
+        return True
+    except Exception as e:
+        logger.error("Failed to delete flagged message in %s: %s", chat_id, e)
+        return False
+
+async def route_group_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Single entry point for group messages: the short-term purge first, then the Arabic filter."""
+    if await delete_any_messages(update, context):
+        return
+    await delete_arabic_messages(update, context)
 
 async def remove_deletion_flag_after_timeout(group_id):
     await asyncio.sleep(MESSAGE_DELETE_TIMEFRAME)
     if group_id in delete_all_messages_after_removal:
         delete_all_messages_after_removal.pop(group_id, None)
-        logger.info(f"Deletion flag removed for group {group_id}")
+        logger.info("Deletion flag removed for group %s", group_id)
+
+# Full tracebacks are logged once per distinct error per minute; repeats get a one-liner
+error_counts = Counter()
+error_counts_minute = None
 
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    logger.error("Error in the bot:", exc_info=context.error)
+    global error_counts_minute
+    minute = time.monotonic() // 60
+    if minute != error_counts_minute:
+        error_counts.clear()
+        error_counts_minute = minute
+
+    key = (type(context.error).__name__, str(context.error)[:80])
+    error_counts[key] += 1
+    if error_counts[key] == 1:
+        logger.error("Error in the bot:", exc_info=context.error)
+    else:
+        logger.error("Repeated error %r x%d", key, error_counts[key])
 
 # ------------------- be_sad / be_happy / check Command Handlers -------------------
 
+@admin_only
 async def be_sad_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    if user.id != ALLOWED_USER_ID:
-        return
 
     if len(context.args) != 1:
-        msg = "⚠️ Usage: `/be_sad <group_id>`"
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(msg, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=USAGE_BE_SAD, parse_mode='MarkdownV2')
         return
 
     try:
         g_id = int(context.args[0])
     except:
-        w = "⚠️ group_id must be integer."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(w, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=MSG_GROUP_ID_NOT_INT, parse_mode='MarkdownV2')
         return
 
     if not group_exists(g_id):
-        e = f"⚠️ Group `{g_id}` is not registered."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(e, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=MSG_GROUP_NOT_REGISTERED.format(md2(g_id)), parse_mode='MarkdownV2')
         return
 
     try:
-        enable_deletion(g_id)
-        cf = f"✅ Arabic deletion enabled for group `{g_id}`."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(cf, version=2), parse_mode='MarkdownV2')
+        await asyncio.to_thread(enable_deletion, g_id)
+        await context.bot.send_message(chat_id=user.id, text=MSG_DELETION_ENABLED.format(md2(g_id)), parse_mode='MarkdownV2')
     except Exception as e:
-        logger.error(f"Error enabling deletion for group {g_id}: {e}")
-        err = "⚠️ Could not enable deletion. Check logs."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(err, version=2), parse_mode='MarkdownV2')
+        logger.error("Error enabling deletion for group %s: %s", g_id, e)
+        await context.bot.send_message(chat_id=user.id, text=MSG_ENABLE_DELETION_FAILED, parse_mode='MarkdownV2')
 
+@admin_only
 async def be_happy_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    if user.id != ALLOWED_USER_ID:
-        return
 
     if len(context.args) != 1:
-        msg = "⚠️ Usage: `/be_happy <group_id>`"
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(msg, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=USAGE_BE_HAPPY, parse_mode='MarkdownV2')
         return
 
     try:
         g_id = int(context.args[0])
     except:
-        w = "⚠️ group_id must be integer."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(w, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=MSG_GROUP_ID_NOT_INT, parse_mode='MarkdownV2')
         return
 
     if not group_exists(g_id):
-        e = f"⚠️ Group `{g_id}` is not registered."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(e, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=MSG_GROUP_NOT_REGISTERED.format(md2(g_id)), parse_mode='MarkdownV2')
         return
 
     try:
-        disable_deletion(g_id)
-        cf = f"✅ Arabic deletion disabled for group `{g_id}`."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(cf, version=2), parse_mode='MarkdownV2')
+        await asyncio.to_thread(disable_deletion, g_id)
+        await context.bot.send_message(chat_id=user.id, text=MSG_DELETION_DISABLED.format(md2(g_id)), parse_mode='MarkdownV2')
     except Exception as e:
-        logger.error(f"Error disabling deletion for group {g_id}: {e}")
-        err = "⚠️ Could not disable deletion. Check logs."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(err, version=2), parse_mode='MarkdownV2')
+        logger.error("Error disabling deletion for group %s: %s", g_id, e)
+        await context.bot.send_message(chat_id=user.id, text=MSG_DISABLE_DELETION_FAILED, parse_mode='MarkdownV2')
 
+@admin_only
 async def check_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    if user.id != ALLOWED_USER_ID:
-        return
 
     if len(context.args) != 1:
-        msg = "⚠️ Usage: `/check <group_id>`"
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(msg, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=USAGE_CHECK, parse_mode='MarkdownV2')
         return
 
     try:
         g_id = int(context.args[0])
     except:
-        w = "⚠️ group_id must be integer."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(w, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=MSG_GROUP_ID_NOT_INT, parse_mode='MarkdownV2')
         return
 
     if not group_exists(g_id):
-        e = f"⚠️ Group `{g_id}` is not registered."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(e, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=MSG_GROUP_NOT_REGISTERED.format(md2(g_id)), parse_mode='MarkdownV2')
         return
 
     try:
         # Fetch current members from the group
-        current_members = []
+        current_members = set()
         async for member in context.bot.get_chat_members(g_id):
-            current_members.append(member.user.id)
+            current_members.add(member.user.id)
 
-        # Fetch removed_users from DB
-        removed_users = list_removed_users(g_id)
-        removed_user_ids = [user_id for (_, user_id, _, _) in removed_users]
+        # Fetch removed user ids from DB
+        removed_ids = await asyncio.to_thread(removed_user_ids, g_id)
 
         # Find discrepancies
-        not_in_group = [uid for uid in removed_user_ids if uid not in current_members]
-        still_in = [uid for uid in removed_user_ids if uid in current_members]
+        not_in_group = sorted(removed_ids - current_members)
+        still_in = sorted(removed_ids & current_members)
 
         # Prepare response
-        resp = "🔍 *Check Results:*\n\n"
+        # Templates are escaped at import; only the ids are formatted in per line
+        parts = [CHECK_HEADER]
         if not_in_group:
-            resp += f"• Users not in group `{g_id}` anymore:\n"
-            resp += "\n".join([f"  - `{uid}`" for uid in not_in_group])
-            resp += "\n\n"
+            parts.append(CHECK_NOT_IN_GROUP.format(md2(g_id)))
+            parts.extend(CHECK_USER_LINE.format(md2(uid)) for uid in not_in_group)
+            parts.append("\n")
         else:
-            resp += "• No users missing from the group.\n\n"
+            parts.append(CHECK_NONE_MISSING)
 
         if still_in:
-            resp += f"• Users still in group `{g_id}` who should be removed:\n"
-            resp += "\n".join([f"  - `{uid}`" for uid in still_in])
-            resp += "\n\n"
-            resp += "🔨 Attempting to auto-ban these users..."
+            parts.append(CHECK_STILL_IN.format(md2(g_id)))
+            parts.extend(CHECK_USER_LINE.format(md2(uid)) for uid in still_in)
+            parts.append(CHECK_AUTO_BAN)
 
             # Auto-ban the users
             for x in still_in:
                 try:
                     await context.bot.ban_chat_member(chat_id=g_id, user_id=x)
-                    logger.info(f"Auto-banned user {x} in group {g_id} after /check.")
+                    logger.info("Auto-banned user %s in group %s after /check.", x, g_id)
                 except Exception as e:
-                    logger.error(f"Failed to ban {x} in group {g_id}: {e}")
+                    logger.error("Failed to ban %s in group %s: %s", x, g_id, e)
         else:
-            resp += "• No discrepancies found."
+            parts.append(CHECK_NO_DISCREPANCIES)
 
-        await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(resp, version=2),
-            parse_mode='MarkdownV2'
-        )
+        await send_chunked(context.bot, user.id, parts, parse_mode='MarkdownV2')
     except Exception as e:
-        logger.error(f"Error during /check for group {g_id}: {e}")
-        err = "⚠️ An error occurred while performing the check. Check logs for details."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(err, version=2), parse_mode='MarkdownV2')
+        logger.error("Error during /check for group %s: %s", g_id, e)
+        await context.bot.send_message(chat_id=user.id, text=MSG_CHECK_FAILED, parse_mode='MarkdownV2')
 
+@admin_only
 async def link_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    if user.id != ALLOWED_USER_ID:
-        return
 
     if len(context.args) != 1:
-        msg = "⚠️ Usage: `/link <group_id>`"
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(msg, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=USAGE_LINK, parse_mode='MarkdownV2')
         return
 
     try:
         g_id = int(context.args[0])
     except:
-        w = "⚠️ group_id must be integer."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(w, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=MSG_GROUP_ID_NOT_INT, parse_mode='MarkdownV2')
         return
 
     if not group_exists(g_id):
-        e = f"⚠️ Group `{g_id}` is not registered."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(e, version=2), parse_mode='MarkdownV2')
+        await context.bot.send_message(chat_id=user.id, text=MSG_GROUP_NOT_REGISTERED.format(md2(g_id)), parse_mode='MarkdownV2')
         return
 
     try:
@@ -1249,187 +1510,129 @@ async def link_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
             member_limit=1,
             name="One-Time Link"
         )
-        cf = f"✅ One-time invite link for group `{g_id}`:\n\n{invite_link_obj.invite_link}"
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(cf, version=2), parse_mode='MarkdownV2')
-        logger.info(f"Created one-time link for {g_id}: {invite_link_obj.invite_link}")
+        await context.bot.send_message(chat_id=user.id, text=MSG_INVITE_LINK.format(md2(g_id), md2(invite_link_obj.invite_link)), parse_mode='MarkdownV2')
+        logger.info("Created one-time link for %s: %s", g_id, invite_link_obj.invite_link)
     except Exception as e:
-        logger.error(f"Error creating link for {g_id}: {e}")
-        err = "⚠️ Could not create invite link. Check bot admin rights & logs."
-        await context.bot.send_message(chat_id=user.id, text=escape_markdown(err, version=2), parse_mode='MarkdownV2')
-
-async def permission_type_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user = update.effective_user
-    if user.id != ALLOWED_USER_ID:
-        return
-
-    types_list = "\n".join([f"• `{ptype}`" for ptype in VALID_PERMISSION_TYPES])
-    message = (
-        "*Possible `permission_type` values for `/limit`:*\n\n"
-        f"{types_list}\n\n"
-        "Example usage:\n"
-        "`/limit <group_id> <user_id> photos off`\n\n"
-        "This disallows that user from sending **photos** in the group.\n\n"
-        "Remember: The bot must be an admin with can_restrict_members for this to work."
-    )
-
-    await context.bot.send_message(
-        chat_id=user.id,
-        text=escape_markdown(message, version=2),
-        parse_mode='MarkdownV2'
-    )
-
-# ------------------- Deletion & Filtering Handlers -------------------
-
-async def delete_arabic_messages(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    msg = update.message
-    if not msg:
-        return
-    user = msg.from_user
-    chat_id = msg.chat.id
-    if not is_deletion_enabled(chat_id):
-        return
-    if is_bypass_user(user.id):
-        return
-
-    text_or_caption = (msg.text or msg.caption or "")
-    if text_or_caption and has_arabic(text_or_caption):
-        try:
-            await msg.delete()
-            logger.info(f"Deleted Arabic from user {user.id} in group {chat_id}.")
-        except Exception as e:
-            logger.error(f"Error deleting Arabic message: {e}")
-        return
-
-    if msg.document and msg.document.file_name and msg.document.file_name.lower().endswith('.pdf'):
-        if pdf_available:
-            file_id = msg.document.file_id
-            file_obj = await context.bot.get_file(file_id)
-            with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp_pdf:
-                await file_obj.download_to_drive(tmp_pdf.name)
-                tmp_pdf.flush()
-                try:
-                    with open(tmp_pdf.name, 'rb') as pdf_file:
-                        try:
-                            reader = PyPDF2.PdfReader(pdf_file)
-                            all_text = ""
-                            for page in reader.pages:
-                                all_text += page.extract_text() or ""
-                            if has_arabic(all_text):
-                                await msg.delete()
-                                logger.info(f"Deleted PDF with Arabic from user {user.id} in group {chat_id}.")
-                        except Exception as e:
-                            logger.error(f"PyPDF2 read error: {e}")
-                except Exception as e:
-                    logger.error(f"PDF parse error: {e}")
-                finally:
-                    try:
-                        os.remove(tmp_pdf.name)
-                    except:
-                        pass
-
-    if msg.photo:
-        if pytesseract_available and pillow_available:
-            photo_obj = msg.photo[-1]
-            file_id = photo_obj.file_id
-            file_ref = await context.bot.get_file(file_id)
-            with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as tmp_img:
-                await file_ref.download_to_drive(tmp_img.name)
-                tmp_img.flush()
-                try:
-                    extracted = pytesseract.image_to_string(Image.open(tmp_img.name)) or ""
-                    if has_arabic(extracted):
-                        await msg.delete()
-                        logger.info(f"Deleted image with Arabic from user {user.id} in group {chat_id}.")
-                except Exception as e:
-                    logger.error(f"OCR error: {e}")
-                finally:
-                    try:
-                        os.remove(tmp_img.name)
-                    except:
-                        pass
-
-async def delete_any_messages(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    msg = update.message
-    if not msg:
-        return
-    chat_id = msg.chat.id
-    if chat_id in delete_all_messages_after_removal:
-        expiry = delete_all_messages_after_removal[chat_id]
-        if datetime.utcnow() > expiry:
-            delete_all_messages_after_removal.pop(chat_id, None)
-            logger.info(f"Short-term deletion expired for {chat_id}.")
-            return
-        try:
-            await msg.delete()
-            logger.info(f"Deleted a message in group {chat_id} (short-term).")
-        except Exception as e:
-            logger.error(f"Failed to delete flagged message in {chat_id}: {e}")
+        logger.error("Error creating link for %s: %s", g_id, e)
+        await context.bot.send_message(chat_id=user.id, text=MSG_LINK_FAILED, parse_mode='MarkdownV2')
 
 # ------------------- main() -------------------
 
+_COMMANDS = {
+    "start": start_cmd,
+    "help": help_cmd,
+    "group_add": group_add_cmd,
+    "rmove_group": rmove_group_cmd,
+    "bypass": bypass_cmd,
+    "unbypass": unbypass_cmd,
+    "love": love_cmd,
+    "rmove_user": rmove_user_cmd,
+    "mute": mute_cmd,
+    "unmute": unmute_cmd,
+    "limit": limit_cmd,
+    "slow": slow_cmd,
+    "be_sad": be_sad_cmd,
+    "be_happy": be_happy_cmd,
+    "check": check_cmd,
+    "link": link_cmd,
+    "permission_type": permission_type_cmd,
+    "delete": delete_cmd_flow,
+    "msg": msg_cmd_flow,
+}
+
+@admin_only
+@serialized_per_chat
+async def dispatch_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # "/Cmd@BotName args" -> "cmd"; CommandHandler has already matched it
+    command = update.effective_message.text.split(maxsplit=1)[0][1:].split('@', 1)[0].lower()
+    await _COMMANDS[command](update, context)
+
 def main():
+    if uvloop_available:
+        uvloop.install()
+
     try:
         init_db()
     except Exception as e:
-        logger.critical(f"DB init failure: {e}")
+        logger.critical("DB init failure: %s", e)
         sys.exit("Cannot start due to DB init failure.")
 
-    TOKEN = os.getenv('BOT_TOKEN')
-    if not TOKEN:
-        logger.error("BOT_TOKEN not set.")
-        sys.exit("BOT_TOKEN not set.")
-    TOKEN = TOKEN.strip()
-    if TOKEN.lower().startswith('bot='):
-        TOKEN = TOKEN[4:].strip()
-
     try:
-        app = ApplicationBuilder().token(TOKEN).build()
+        request_cls = OrjsonRequest if orjson_available else HTTPXRequest
+        # getUpdates keeps its own single-connection client; the pool serves all other calls
+        api_request = request_cls(
+            connection_pool_size=API_CONNECTION_POOL_SIZE,
+            pool_timeout=5.0,
+            http_version="2" if http2_available else "1.1"
+        )
+        app = (
+            ApplicationBuilder()
+            .token(CONFIG.token)
+            .request(api_request)
+            .get_updates_request(request_cls(connection_pool_size=1))
+            .rate_limiter(SendRateLimiter())
+            .concurrent_updates(MAX_CONCURRENT_UPDATES)
+            .build()
+        )
     except Exception as e:
-        logger.critical(f"Failed building Telegram app: {e}")
+        logger.critical("Failed building Telegram app: %s", e)
         sys.exit("Bot build error.")
 
-    # Register commands
-    app.add_handler(CommandHandler("start", start_cmd))
-    app.add_handler(CommandHandler("help", help_cmd))
-    app.add_handler(CommandHandler("group_add", group_add_cmd))
-    app.add_handler(CommandHandler("rmove_group", rmove_group_cmd))
-    app.add_handler(CommandHandler("bypass", bypass_cmd))
-    app.add_handler(CommandHandler("unbypass", unbypass_cmd))
-    app.add_handler(CommandHandler("love", love_cmd))
-    app.add_handler(CommandHandler("rmove_user", rmove_user_cmd))
-    app.add_handler(CommandHandler("mute", mute_cmd))
-    app.add_handler(CommandHandler("unmute", unmute_cmd))
-    app.add_handler(CommandHandler("limit", limit_cmd))
-    app.add_handler(CommandHandler("slow", slow_cmd))
-    app.add_handler(CommandHandler("be_sad", be_sad_cmd))
-    app.add_handler(CommandHandler("be_happy", be_happy_cmd))
-    app.add_handler(CommandHandler("check", check_cmd))
-    app.add_handler(CommandHandler("link", link_cmd))
-    app.add_handler(CommandHandler("permission_type", permission_type_cmd))
-    app.add_handler(CommandHandler("delete", delete_cmd_flow))
-    app.add_handler(CommandHandler("msg", msg_cmd_flow))
-
-    # Message handlers
-    # 1) Handle Arabic deletion
-    app.add_handler(MessageHandler(
-        filters.TEXT | filters.CAPTION | filters.Document.ALL | filters.PHOTO,
-        delete_arabic_messages
-    ))
-    # 2) Handle short-term message deletion after removal
-    app.add_handler(MessageHandler(
-        filters.ALL,
-        delete_any_messages
-    ))
-    # 3) Handle group naming or flows (/delete, /msg)
-    app.add_handler(MessageHandler(
-        filters.TEXT & filters.ChatType.PRIVATE,  # Only private chat to avoid confusion in group
-        handle_next_message
-    ))
+    # Handlers in one group are tried in order and only the first match runs,
+    # so the cheap private-chat check goes first.
+    app.add_handlers([
+        # 1) Handle group naming or flows (/delete, /msg); private chat only to avoid confusion in group
+        MessageHandler(PRIVATE_TEXT_FILTER, handle_next_message),
+        # 2) Commands (one handler for all of them, dispatched by name)
+        CommandHandler(list(_COMMANDS), dispatch_command),
+        # 3) Group messages: short-term deletion after removal, then Arabic deletion
+        MessageHandler(GROUP_MESSAGE_FILTER, route_group_message),
+    ])
 
     app.add_error_handler(error_handler)
 
-    logger.info("Bot is starting. All flows are set.")
-    app.run_polling()
+    if CONFIG.mode == 'webhook':
+        logger.info("Bot is starting (webhook). All flows are set.")
+        app.run_webhook(
+            listen="0.0.0.0",
+            port=CONFIG.port,
+            url_path=CONFIG.token,
+            webhook_url=f"{CONFIG.webhook_url}/{CONFIG.token}",
+            secret_token=CONFIG.webhook_secret,
+            allowed_updates=ALLOWED_UPDATES,
+            drop_pending_updates=CONFIG.drop_pending
+        )
+    else:
+        logger.info("Bot is starting (polling). All flows are set.")
+        attempt = 0
+
+        async def reset_backoff(_app):
+            # post_init runs once initialize() has succeeded, so the next failure backs off from 5s again
+            nonlocal attempt
+            attempt = 0
+
+        app.post_init = reset_backoff
+        while True:
+            try:
+                # Long-poll: Telegram holds getUpdates open for up to 30s, no client-side sleep
+                app.run_polling(
+                    timeout=30,
+                    poll_interval=0.0,
+                    bootstrap_retries=-1,
+                    allowed_updates=ALLOWED_UPDATES,
+                    drop_pending_updates=CONFIG.drop_pending,
+                    close_loop=False  # keep the loop so polling can be restarted in-process
+                )
+                break
+            except NetworkError as e:
+                # Only startup failures (initialize()/get_me) land here; the Updater retries
+                # getUpdates errors itself. Back off and restart in-process instead of crash-looping.
+                delay = min(60, 5 * 2 ** attempt)
+                logger.warning("Bot startup failed on network error: %s; retrying in %ds", e, delay)
+                attempt += 1
+                # Sleep on the loop, not time.sleep: PTB's SIGINT/SIGTERM handlers are still installed
+                # on it and only fire while it runs, so a stop request raises SystemExit right away.
+                asyncio.get_event_loop().run_until_complete(asyncio.sleep(delay))
 
 if __name__ == "__main__":
     main()